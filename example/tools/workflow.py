@@ -8,19 +8,41 @@ Outputs only the current task context to minimize token usage.
 
 Usage:
     python workflow.py next              # Get next pending task
+    python workflow.py next --delta --budget 500t  # Only changes, capped size
     python workflow.py status            # Show workflow progress  
     python workflow.py complete TASK_ID -s "summary"  # Mark task done
     python workflow.py reset             # Reset all tasks to pending
     python workflow.py skip TASK_ID      # Skip a task
+    python workflow.py plan -w 1 2 4     # Critical path and ETA for K workers
+    python workflow.py fleet status ROOT # Aggregate many workflow state dirs
+    python workflow.py metrics --serve 9464  # OpenMetrics for Prometheus
+    python workflow.py fork NAME         # Branch the workflow (copy-on-write)
+    python workflow.py restore NAME|ID   # Switch fork or roll back to a snapshot
+    python workflow.py stats [ROOT ...]  # Actual vs estimated durations (p50/p95)
 """
 
 import json
 import argparse
+import atexit
+import glob
+import hashlib
+import heapq
 import importlib.util
+import os
+import re
 import sys
-from datetime import datetime
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
 from pathlib import Path
 
+try:
+    import resource  # POSIX only; memory limits are skipped without it
+except ImportError:
+    resource = None
+
 # Fix Windows console encoding
 if sys.platform == 'win32':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
@@ -28,6 +50,45 @@ if sys.platform == 'win32':
 STATE_FILE = Path(__file__).parent.parent / "state" / "process.json"
 CONFIG_FILE = Path(__file__).parent.parent / "state" / "config.json"
 LIBRARY_DIR = Path(__file__).parent.parent / "library"
+CACHE_DIR = STATE_FILE.parent / ".cache"
+SNAPSHOT_DIR = STATE_FILE.parent / ".snapshots"
+
+# "30 minutes", "1h 30m", "10-15 min" (ranges use the upper bound)
+DURATION_RE = re.compile(
+    r'(\d+(?:\.\d+)?)(?:\s*-\s*(\d+(?:\.\d+)?))?\s*'
+    r'(seconds?|secs?|s|minutes?|mins?|m|hours?|hrs?|h|days?|d)\b',
+    re.IGNORECASE
+)
+DURATION_UNITS = {'s': 1 / 60, 'm': 1, 'h': 60, 'd': 24 * 60}
+
+# Budgets for `next --budget`: "2000" / "2000b" are bytes, "500t" tokens
+BUDGET_RE = re.compile(r'^(\d+)\s*(b|bytes?|t|tok|tokens?)?$', re.IGNORECASE)
+TOKEN_BYTES = 4  # rough bytes-per-token used for budget accounting
+NEXT_DIGEST_SESSIONS = 16
+FLEET_CACHE_TARGETS = 8  # fleet roots / globs whose summaries stay cached
+
+# Defaults for config.settings.skill_isolation
+SKILL_ISOLATION_DEFAULTS = {
+    'enabled': False, 'workers': 2, 'timeout': 10, 'memory_mb': 512,
+    'server': True, 'idle_timeout': 600,
+}
+SKILL_SERVER_FILE = "skill_server.json"  # address + authkey of the running server
+SKILL_SERVER_START_TIMEOUT = 3
+RENDER_CACHE_ENTRIES = 256
+PREFETCH_TIMEOUT = 2  # seconds a transition waits for the next task to render
+
+# Defaults for config.settings.metrics; textfile is relative to the workflow root
+METRICS_DEFAULTS = {'enabled': False, 'textfile': 'state/metrics.prom'}
+METRIC_BUCKETS = {
+    'wait': [60, 300, 900, 1800, 3600, 4 * 3600, 24 * 3600],
+    'latency': [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+}
+
+# Snapshots store tasks / history in chunks of this many records; forks
+# share every chunk they have not changed.
+SNAPSHOT_CHUNK = 256
+SNAPSHOT_LOG_ENTRIES = 200
+STATS_CACHE_SEGMENTS = 4096  # parsed history segments kept in .cache/stats.json
 
 
 def load_state():
@@ -46,69 +107,1012 @@ def load_config():
     with open(CONFIG_FILE, 'r') as f:
         return json.load(f)
 
-def load_skill(skill_file):
-    """Dynamically load a skill file and return its SKILL dict."""
+def read_cache(name, default):
+    """Read a JSON cache file, returning default if missing or corrupt."""
+    try:
+        with open(CACHE_DIR / name, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+def write_text_atomic(path, text):
+    """
+    Write text via a uniquely named temp file + rename.
+
+    Readers never see half a file, and concurrent writers never share a
+    temp file; the last rename wins.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=path.parent,
+                                     prefix=path.name + '.', suffix='.tmp',
+                                     delete=False) as f:
+        f.write(text)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+def write_json_atomic(path, data):
+    """Write JSON atomically (see write_text_atomic)."""
+    write_text_atomic(path, json.dumps(data))
+
+def write_cache(name, data):
+    """
+    Write a JSON cache file under state/.cache/.
+
+    Caches are read-modify-write without a lock, so concurrent commands are
+    last-writer-wins: an entry one of them added may be dropped, which
+    usually only costs recomputing it on a later call. The exception is
+    metrics.json, whose latency, check and gate-wait counters cannot be
+    re-derived: an update from an overlapping command is lost, and the
+    exported counters may step back (see finish_metrics).
+    """
+    write_json_atomic(CACHE_DIR / name, data)
+
+def file_stamp(path):
+    """[mtime_ns, size] of a file, or None if it cannot be stat'ed."""
+    try:
+        st = Path(path).stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+_SKILL_MODULES = {}
+
+def load_skill_module(skill_file):
+    """Import a skill file (once per process) and return the module."""
     skill_path = LIBRARY_DIR / Path(skill_file).name
+    if skill_path in _SKILL_MODULES:
+        return _SKILL_MODULES[skill_path]
     if not skill_path.exists():
         return None
     spec = importlib.util.spec_from_file_location("skill", skill_path)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
-    return getattr(module, 'SKILL', None)
+    _SKILL_MODULES[skill_path] = module
+    return module
+
+
+def parse_duration(text):
+    """Parse an estimated_time string into minutes (None if unparseable)."""
+    if isinstance(text, (int, float)):
+        return float(text)
+    total = None
+    for low, high, unit in DURATION_RE.findall(text or ''):
+        total = (total or 0.0) + float(high or low) * DURATION_UNITS[unit[0].lower()]
+    return total
+
+def positive_int(text):
+    """argparse type for counts that must be at least 1."""
+    try:
+        value = int(text)
+    except ValueError:
+        value = 0
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got '{text}'")
+    return value
+
+def parse_budget(text):
+    """Parse a --budget value into bytes."""
+    m = BUDGET_RE.match(text.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"invalid budget '{text}' (use e.g. 2000 or 500t)")
+    unit = (m.group(2) or 'b').lower()
+    return int(m.group(1)) * (TOKEN_BYTES if unit.startswith('t') else 1)
+
+def parse_timestamp(text):
+    """Parse an ISO-8601 timestamp (naive means UTC) into epoch seconds."""
+    try:
+        moment = datetime.fromisoformat(text.rstrip('Z'))
+    except (AttributeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+def format_minutes(minutes):
+    """Format minutes as a compact '1d 2h 5m' string."""
+    minutes = int(round(minutes))
+    days, rest = divmod(minutes, 24 * 60)
+    hours, mins = divmod(rest, 60)
+    parts = [f"{days}d" if days else "", f"{hours}h" if hours else "", f"{mins}m" if mins else ""]
+    return " ".join(p for p in parts if p) or "0m"
+
+def load_task_meta(state):
+    """
+    Return {task_id: (minutes, dependencies)} for every task in state.
+
+    `estimated_time` / `dependencies` on the task record win over the
+    skill file's TASKS entry. Skill metadata is cached in .cache/plan.json
+    keyed by file mtime and size, so a skill is only imported again
+    after it changes.
+    """
+    cache = read_cache("plan.json", {})
+    skills = cache.setdefault('skills', {})
+    checked = {}
+    parsed = {}
+    dirty = False
+    meta = {}
+
+    for task in state['tasks']:
+        skill_file = task.get('skill_file') or ''
+        name = Path(skill_file).name
+        if name not in checked:
+            stamp = file_stamp(LIBRARY_DIR / name)
+            entry = skills.get(name)
+            if stamp and (entry is None or entry['stamp'] != stamp):
+                module = load_skill_module(skill_file)
+                tasks = getattr(module, 'TASKS', None) or {}
+                entry = {
+                    'stamp': stamp,
+                    'tasks': {
+                        tid: [t.get('estimated_time'), list(t.get('dependencies') or [])]
+                        for tid, t in tasks.items()
+                    }
+                }
+                skills[name] = entry
+                dirty = True
+            checked[name] = entry['tasks'] if stamp and entry else {}
+
+        estimate, deps = checked[name].get(task['id'], [None, []])
+        estimate = task.get('estimated_time', estimate)
+        if estimate not in parsed:
+            parsed[estimate] = parse_duration(estimate) or 0.0
+        meta[task['id']] = (parsed[estimate], task.get('dependencies', deps) or [])
+
+    if dirty:
+        write_cache("plan.json", cache)
+    return meta
+
+def build_graph(state, meta):
+    """
+    Return predecessor index lists for the task DAG.
+
+    If no task declares dependencies the workflow is treated as the
+    sequential chain it is executed as.
+    """
+    tasks = state['tasks']
+    if not any(meta[t['id']][1] for t in tasks):
+        return [[i - 1] if i else [] for i in range(len(tasks))]
+    index = {t['id']: i for i, t in enumerate(tasks)}
+    return [
+        [index[d] for d in meta[t['id']][1] if d in index]
+        for t in tasks
+    ]
+
+def topo_order(preds):
+    """Kahn's algorithm in O(V+E). Returns None if the graph has a cycle."""
+    n = len(preds)
+    succs = [[] for _ in range(n)]
+    indegree = [len(p) for p in preds]
+    for i, ps in enumerate(preds):
+        for p in ps:
+            succs[p].append(i)
+    order = [i for i in range(n) if not indegree[i]]
+    for i in order:
+        for s in succs[i]:
+            indegree[s] -= 1
+            if not indegree[s]:
+                order.append(s)
+    return order if len(order) == n else None
+
+def critical_path(order, preds, durations):
+    """
+    Forward/backward pass over a topological order.
+
+    Returns (earliest_start, latest_start, makespan, path) where path is
+    the list of task indices on one critical path.
+    """
+    n = len(durations)
+    es = [0.0] * n
+    for i in order:
+        for p in preds[i]:
+            if es[p] + durations[p] > es[i]:
+                es[i] = es[p] + durations[p]
+    makespan = max((es[i] + durations[i] for i in range(n)), default=0.0)
+
+    lf = [makespan] * n
+    for i in reversed(order):
+        start = lf[i] - durations[i]
+        for p in preds[i]:
+            if start < lf[p]:
+                lf[p] = start
+    ls = [lf[i] - durations[i] for i in range(n)]
+
+    path = []
+    eps = 1e-9
+    current = next(
+        (i for i in reversed(order)
+         if abs(es[i] + durations[i] - makespan) < eps and abs(ls[i] - es[i]) < eps),
+        None
+    )
+    while current is not None:
+        path.append(current)
+        current = next(
+            (p for p in preds[current]
+             if abs(es[p] + durations[p] - es[current]) < eps and abs(ls[p] - es[p]) < eps),
+            None
+        )
+    path.reverse()
+    return es, ls, makespan, path
+
+def simulate_workers(preds, durations, priority, workers):
+    """
+    List-schedule the DAG on K workers, least-slack task first.
+
+    Returns the simulated makespan. O((V+E) log V).
+    """
+    n = len(durations)
+    succs = [[] for _ in range(n)]
+    indegree = [len(p) for p in preds]
+    for i, ps in enumerate(preds):
+        for p in ps:
+            succs[p].append(i)
+    ready = [(priority[i], i) for i in range(n) if not indegree[i]]
+    heapq.heapify(ready)
+    running = []
+    clock = 0.0
+    while ready or running:
+        while ready and len(running) < workers:
+            _, i = heapq.heappop(ready)
+            heapq.heappush(running, (clock + durations[i], i))
+        clock, i = heapq.heappop(running)
+        for s in succs[i]:
+            indegree[s] -= 1
+            if not indegree[s]:
+                heapq.heappush(ready, (priority[s], s))
+    return clock
+
+def graph_digest(state, meta):
+    """Hash of the DAG shape and estimates (statuses excluded)."""
+    h = hashlib.sha1()
+    for task in state['tasks']:
+        minutes, deps = meta[task['id']]
+        h.update(f"{task['id']}\0{minutes}\0{','.join(deps)}\n".encode('utf-8'))
+    return h.hexdigest()
+
+
+def find_next(state, config):
+    """
+    Locate the next pending task.
+
+    Returns (index, task, gate) where gate is the phase dict when reaching
+    the task crosses a boundary into a phase that requires approval.
+    (None, None, None) means every task is done.
+    """
+    tasks = state['tasks']
+    for i, task in enumerate(tasks):
+        if task['status'] == 'pending':
+            if i > 0 and tasks[i-1]['phase'] != task['phase']:
+                phase_info = next(
+                    (p for p in config['phases'] if p['id'] == task['phase']),
+                    None
+                )
+                if phase_info and phase_info.get('requires_approval'):
+                    return i, task, phase_info
+            return i, task, None
+    return None, None, None
+
+
+def render_task(task):
+    """Load a task's skill and render its instructions."""
+    module = load_skill_module(task['skill_file'])
+    if module is None:
+        return {'skill': None, 'instructions': None}
+    get_instructions = getattr(module, 'get_instructions', None)
+    return {
+        'skill': getattr(module, 'SKILL', None),
+        'instructions': get_instructions(task['id']) if callable(get_instructions) else None,
+    }
+
+_SKILL_POOL = None
+_SKILL_POOL_LOCK = threading.Lock()
+_SKILL_STAMPS = {}  # per worker: skill path -> stamp of the imported module
+
+def skill_worker_init(library_dir, memory_mb):
+    """Pool initializer: point at the library and apply the memory limit."""
+    global LIBRARY_DIR
+    LIBRARY_DIR = Path(library_dir)
+    if memory_mb and resource is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        limit = memory_mb * 1024 * 1024
+        if hard == resource.RLIM_INFINITY or limit < hard:
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def skill_worker_render(task):
+    """
+    Render a task inside a pool worker, turning failures into an error.
+
+    Skills are imported on first use and kept for the worker's lifetime
+    (re-imported when the file changes), so one module hanging at import
+    only affects the tasks that use it.
+    """
+    skill_path = LIBRARY_DIR / Path(task['skill_file']).name
+    stamp = file_stamp(skill_path)
+    if _SKILL_STAMPS.get(skill_path) != stamp:
+        _SKILL_MODULES.pop(skill_path, None)
+        _SKILL_STAMPS[skill_path] = stamp
+    try:
+        return render_task(task)
+    except (Exception, SystemExit) as e:
+        return {'skill': None, 'instructions': None, 'error': f"{type(e).__name__}: {e}"}
+
+def get_skill_pool(settings):
+    """Start (once) the pool of skill worker processes."""
+    global _SKILL_POOL
+    if _SKILL_POOL is None:
+        import multiprocessing
+        method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+        _SKILL_POOL = multiprocessing.get_context(method).Pool(
+            settings['workers'],
+            initializer=skill_worker_init,
+            initargs=(str(LIBRARY_DIR), settings['memory_mb'])
+        )
+        atexit.register(shutdown_skill_pool)
+    return _SKILL_POOL
+
+def shutdown_skill_pool():
+    """Stop the skill worker pool, killing any worker still running."""
+    global _SKILL_POOL
+    if _SKILL_POOL is not None:
+        _SKILL_POOL.terminate()
+        _SKILL_POOL.join()
+        _SKILL_POOL = None
+
+def pool_render(task, settings):
+    """Render a task in this process's worker pool with a per-call timeout."""
+    import multiprocessing
+    with _SKILL_POOL_LOCK:
+        pending = get_skill_pool(settings).apply_async(skill_worker_render, (task,))
+    try:
+        return pending.get(settings['timeout'])
+    except multiprocessing.TimeoutError:
+        with _SKILL_POOL_LOCK:
+            shutdown_skill_pool()  # the worker may be hung; never reuse it
+        return {'skill': None, 'instructions': None,
+                'error': f"get_instructions timed out after {settings['timeout']}s"}
+    except Exception as e:
+        return {'skill': None, 'instructions': None, 'error': f"{type(e).__name__}: {e}"}
+
+def start_skill_server():
+    """Launch `workflow.py skill-server` detached and wait for it to listen."""
+    import subprocess
+    try:
+        (CACHE_DIR / SKILL_SERVER_FILE).unlink()
+    except OSError:
+        pass
+    detach = ({'start_new_session': True} if os.name == 'posix'
+              else {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP})
+    subprocess.Popen([sys.executable, str(Path(__file__).resolve()), 'skill-server'],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, **detach)
+    deadline = time.time() + SKILL_SERVER_START_TIMEOUT
+    while time.time() < deadline and not (CACHE_DIR / SKILL_SERVER_FILE).exists():
+        time.sleep(0.02)
+
+def server_render(task, settings):
+    """
+    Render through the persistent skill server, starting it if needed.
+
+    Returns None when no server can be reached, so the caller can fall
+    back to a pool of its own.
+    """
+    from multiprocessing.connection import AuthenticationError, Client
+    for attempt in range(2):
+        info = read_cache(SKILL_SERVER_FILE, None)
+        if info:
+            try:
+                with Client(tuple(info['address']), authkey=bytes.fromhex(info['authkey'])) as conn:
+                    conn.send(task)
+                    if conn.poll(settings['timeout'] + SKILL_SERVER_START_TIMEOUT):
+                        return conn.recv()
+                    return {'skill': None, 'instructions': None,
+                            'error': "skill server did not answer"}
+            except (OSError, EOFError, AuthenticationError):
+                pass
+        if attempt == 0:
+            start_skill_server()
+    return None
+
+def render_task_isolated(task, settings):
+    """
+    Render a task in isolated worker processes with a per-call timeout.
+
+    Workers live in the persistent skill server (settings.skill_isolation
+    .server) so their imports stay warm across CLI calls; without it, or
+    if it cannot be reached, a pool for this invocation is used. Results
+    are cached in .cache/render.json by (skill file hash, task id), so an
+    unchanged skill is never executed twice for the same task.
+    """
+    skill_path = LIBRARY_DIR / Path(task['skill_file']).name
+    try:
+        digest = hashlib.sha1(skill_path.read_bytes()).hexdigest()
+    except OSError:
+        return {'skill': None, 'instructions': None}
+    key = f"{digest}:{task['id']}"
+    cache = read_cache("render.json", {})
+    if key in cache:
+        return cache[key]
+
+    rendered = server_render(task, settings) if settings['server'] else None
+    if rendered is None:
+        rendered = pool_render(task, settings)
+
+    if 'error' not in rendered:
+        cache[key] = rendered
+        write_cache("render.json", dict(list(cache.items())[-RENDER_CACHE_ENTRIES:]))
+    return rendered
+
+def skill_isolation_settings(config):
+    """settings.skill_isolation merged over SKILL_ISOLATION_DEFAULTS."""
+    settings = dict(SKILL_ISOLATION_DEFAULTS)
+    settings.update(config.get('settings', {}).get('skill_isolation', {}))
+    return settings
+
+def render_skill(task, config, isolate=False):
+    """Render a task in-process, or in the worker pool when isolation is on."""
+    settings = skill_isolation_settings(config)
+    if isolate or settings['enabled']:
+        return render_task_isolated(task, settings)
+    return render_task(task)
+
+def build_next_sections(task, rendered):
+    """
+    Split `next` output into (name, priority, lines) sections.
+
+    Priority 0 sections are always emitted; higher numbers are the first
+    to be truncated when a budget is in force.
+    """
+    skill = rendered['skill'] or {}
+    sections = [('header', 0, [
+        f"📋 CURRENT TASK: {task['id']}",
+        f"   Name: {task['name']}",
+        f"   Phase: {task['phase']}",
+        f"   Skill: {task['skill_file']}",
+        "",
+    ])]
+    if rendered.get('error'):
+        sections.append(('instructions', 1,
+                         ["📖 INSTRUCTIONS:", f"   ❌ Skill failed: {rendered['error']}", ""]))
+    elif rendered['instructions'] is not None:
+        sections.append(('instructions', 1,
+                         ["📖 INSTRUCTIONS:", rendered['instructions'].strip('\n'), ""]))
+    elif skill.get('steps'):
+        sections.append(('instructions', 1,
+                         ["📖 INSTRUCTIONS:"] + [f"   {step}" for step in skill['steps']] + [""]))
+    if skill.get('checks'):
+        sections.append(('checks', 2,
+                         ["✅ COMPLETION CHECKS:"] + [f"   [ ] {check}" for check in skill['checks']]))
+    sections.append(('footer', 0, [
+        "",
+        f"When done: python workflow.py complete {task['id']} -s \"your summary\"",
+    ]))
+    return sections
+
+def text_size(lines):
+    """UTF-8 size in bytes of lines as printed."""
+    return sum(len(line.encode('utf-8')) + 1 for line in lines)
+
+def truncate_sections(sections, budget):
+    """
+    Fit sections into budget bytes, cutting the lowest priority first.
+
+    A cut section keeps as many whole lines as fit, followed by a hint
+    telling the agent how to expand it; if not even the hint fits, the
+    section is dropped. Priority 0 sections are never cut, so the result
+    can still exceed budget when they alone do.
+    """
+    allowance = budget - sum(text_size(lines) for _, prio, lines in sections if not prio)
+    kept = {}
+    for name, prio, lines in sorted((s for s in sections if s[1]), key=lambda s: s[1]):
+        size = text_size(lines)
+        if size <= allowance:
+            kept[name] = lines
+            allowance -= size
+            continue
+        hint = f"   … {name} truncated ({size} bytes): next --expand {name}"
+        room = allowance - text_size([hint])
+        if room < 0:
+            kept[name] = []
+            continue
+        cut = []
+        for line in "\n".join(lines).split("\n"):
+            room -= text_size([line])
+            if room < 0:
+                break
+            cut.append(line)
+        kept[name] = cut + [hint]
+        allowance -= text_size(kept[name])
+    return [(name, prio, kept.get(name, lines)) for name, prio, lines in sections]
+
+def apply_delta(sections, task_id, session):
+    """
+    Collapse sections unchanged since this session's last `next` for task_id.
+
+    Digests are kept in .cache/next_digest.json (a few sessions at most).
+    """
+    digests = read_cache("next_digest.json", {})
+    previous = digests.pop(session, {})
+    current = {
+        name: hashlib.sha1("\n".join(lines).encode('utf-8')).hexdigest()
+        for name, _, lines in sections
+    }
+    same_task = previous.get('task') == task_id
+    result = []
+    for name, prio, lines in sections:
+        if prio and same_task and previous['sections'].get(name) == current[name]:
+            lines = [f"   ({name} unchanged: next --expand {name})"]
+        result.append((name, prio, lines))
+    digests[session] = {'task': task_id, 'sections': current}
+    write_cache("next_digest.json", dict(list(digests.items())[-NEXT_DIGEST_SESSIONS:]))
+    return result
+
+
+def prefetch_next(state, config):
+    """
+    Pre-render the next task right after a state transition.
+
+    Only the task cmd_next will serve is rendered, on a daemon thread
+    given PREFETCH_TIMEOUT seconds, and any failure is swallowed: the
+    transition is already saved, and `next` simply renders the task
+    itself on a miss. The result is stored in .cache/prefetch.json with
+    the state, config and skill file stamps it was built from; cmd_next
+    only serves it while all of them are unchanged.
+    """
+    try:
+        i, task, gate = find_next(state, config)
+        rendered = {}
+        if task and not gate:
+            result = {}
+
+            def render():
+                try:
+                    result['rendered'] = render_skill(task, config)
+                except Exception:
+                    pass
+
+            worker = threading.Thread(target=render, daemon=True)
+            worker.start()
+            worker.join(PREFETCH_TIMEOUT)
+            if result.get('rendered') and not result['rendered'].get('error'):
+                rendered[task['id']] = {
+                    'skill_stamp': file_stamp(LIBRARY_DIR / Path(task['skill_file']).name),
+                    'rendered': result['rendered'],
+                }
+
+        write_cache("prefetch.json", {
+            'state_stamp': file_stamp(STATE_FILE),
+            'config_stamp': file_stamp(CONFIG_FILE),
+            'task': task,
+            'gate': gate,
+            'prev_phase': state['tasks'][i-1]['phase'] if gate else None,
+            'rendered': rendered,
+        })
+    except Exception:
+        pass  # best effort: a stale prefetch no longer matches the saved state
+
+def load_prefetch():
+    """Return the prefetch entry if state and config are unchanged since it was built."""
+    prefetch = read_cache("prefetch.json", None)
+    if (not prefetch
+            or prefetch.get('state_stamp') != file_stamp(STATE_FILE)
+            or prefetch.get('config_stamp') != file_stamp(CONFIG_FILE)):
+        return None
+    return prefetch
+
+
+_METRICS = None  # metrics store for this invocation when settings.metrics is enabled
+
+def metrics_settings(config):
+    """settings.metrics merged over METRICS_DEFAULTS."""
+    settings = dict(METRICS_DEFAULTS)
+    settings.update(config.get('settings', {}).get('metrics', {}))
+    return settings
+
+def new_histogram(kind):
+    """Empty histogram with per-bucket (non-cumulative) counts plus +Inf."""
+    return {'counts': [0] * (len(METRIC_BUCKETS[kind]) + 1), 'sum': 0.0, 'count': 0}
+
+def observe(histogram, kind, value):
+    """Record one observation in a histogram."""
+    bucket = next((i for i, le in enumerate(METRIC_BUCKETS[kind]) if value <= le),
+                  len(METRIC_BUCKETS[kind]))
+    histogram['counts'][bucket] += 1
+    histogram['sum'] += value
+    histogram['count'] += 1
+
+def rebuild_metrics(store, state):
+    """
+    Re-derive state-backed metrics from process.json in one pass.
+
+    Only needed when the state changed outside a recorded transition
+    (first run, reset, restore, hand edits). Command latency, check
+    results and gate waits are not derivable and are kept.
+    """
+    tasks = {}
+    transitions = {}
+    for task in state['tasks']:
+        key = f"{task['phase']}|{task['status']}"
+        tasks[key] = tasks.get(key, 0) + 1
+        if task['status'] != 'pending':
+            transitions[key] = transitions.get(key, 0) + 1
+
+    # Pending time runs from the previous recorded event (a completion or
+    # the reset marker); a completion with nothing before it is not timed,
+    # and completing an already completed task is not a transition.
+    pending = new_histogram('wait')
+    completed = set()
+    last = None
+    for entry in state.get('session_history', []):
+        moment = parse_timestamp(entry.get('timestamp'))
+        if moment is None or entry.get('task_id') in completed:
+            continue
+        if entry.get('action') == 'completed':
+            completed.add(entry.get('task_id'))
+            if last is not None:
+                observe(pending, 'wait', max(moment - last, 0.0))
+        last = moment
+
+    store.update({
+        'workflow_id': state.get('workflow_id'),
+        'tasks': tasks,
+        'transitions': transitions,
+        'pending_seconds': pending,
+        'completions': sum(1 for task in state['tasks'] if task['status'] == 'completed'),
+        'last_transition': last,
+        'state_stamp': file_stamp(STATE_FILE),
+    })
+
+def start_metrics(config):
+    """Load the metrics store for this invocation if metrics are enabled."""
+    global _METRICS
+    if metrics_settings(config)['enabled']:
+        _METRICS = read_cache("metrics.json", None) or {
+            'checks': {'pass': 0, 'fail': 0, 'unreported': 0},
+            'gate_blocked': {},
+            'gate_wait_seconds': new_histogram('wait'),
+            'command_seconds': {},
+        }
+
+def sync_metrics(state):
+    """Bring the store in line with state before a transition is recorded."""
+    if _METRICS is not None and (_METRICS.get('state_stamp') != file_stamp(STATE_FILE)
+                                 or _METRICS.get('workflow_id') != state.get('workflow_id')
+                                 or 'completions' not in _METRICS):
+        rebuild_metrics(_METRICS, state)
+
+def record_transition(task, previous, passed=0, failed=0, unreported=0):
+    """
+    Apply one status change (already saved to state) to the metrics store.
+
+    passed / failed are the checks the caller reported; unreported is the
+    rest of the skill's checks, which nothing is known about. Re-completing
+    or re-skipping a task is not a transition and records nothing.
+    """
+    if _METRICS is None:
+        return
+    _METRICS['state_stamp'] = file_stamp(STATE_FILE)
+    if previous == task['status']:
+        return
+    now = time.time()
+    tasks = _METRICS['tasks']
+    old_key = f"{task['phase']}|{previous}"
+    new_key = f"{task['phase']}|{task['status']}"
+    tasks[old_key] = tasks.get(old_key, 0) - 1
+    tasks[new_key] = tasks.get(new_key, 0) + 1
+    _METRICS['transitions'][new_key] = _METRICS['transitions'].get(new_key, 0) + 1
+
+    if task['status'] == 'completed':
+        if _METRICS.get('last_transition') is not None:
+            observe(_METRICS['pending_seconds'], 'wait', max(now - _METRICS['last_transition'], 0.0))
+        _METRICS['completions'] = _METRICS.get('completions', 0) + 1
+        checks = _METRICS['checks']
+        for result, count in (('pass', passed), ('fail', failed), ('unreported', unreported)):
+            checks[result] = checks.get(result, 0) + count
+
+    blocked_since = _METRICS['gate_blocked'].pop(task['phase'], None)
+    if blocked_since is not None:
+        observe(_METRICS['gate_wait_seconds'], 'wait', now - blocked_since)
+    _METRICS['last_transition'] = now
+
+def skill_check_count(task, config):
+    """
+    Number of checks in a task's SKILL dict, without calling get_instructions.
+
+    With isolation on the skill is never imported here; the count comes
+    from an isolated render already in .cache/render.json, if any.
+    None when unknown.
+    """
+    skill_path = LIBRARY_DIR / Path(task['skill_file']).name
+    try:
+        if skill_isolation_settings(config)['enabled']:
+            prefix = hashlib.sha1(skill_path.read_bytes()).hexdigest() + ':'
+            skill = next((r['skill'] for key, r in read_cache("render.json", {}).items()
+                          if key.startswith(prefix)), None)
+        else:
+            module = load_skill_module(task['skill_file'])
+            skill = getattr(module, 'SKILL', None) if module else None
+        return len(skill.get('checks', [])) if skill else None
+    except Exception:
+        return None
+
+def record_gate_blocked(phase):
+    """Note the first time `next` was stopped by an approval gate."""
+    if _METRICS is not None:
+        _METRICS['gate_blocked'].setdefault(phase, time.time())
+
+def format_labels(**labels):
+    """OpenMetrics label set with escaped values."""
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+def render_metrics(store):
+    """Render the metrics store in the OpenMetrics text format."""
+    wf = store.get('workflow_id') or 'unknown'
+    out = []
+
+    def family(name, kind, help_text):
+        out.append(f"# TYPE {name} {kind}")
+        out.append(f"# HELP {name} {help_text}")
+
+    def histogram(name, kind, hist, **labels):
+        cumulative = 0
+        for le, count in zip(METRIC_BUCKETS[kind] + ['+Inf'], hist['counts']):
+            cumulative += count
+            out.append(f"{name}_bucket{format_labels(workflow=wf, **labels, le=le)} {cumulative}")
+        out.append(f"{name}_sum{format_labels(workflow=wf, **labels)} {hist['sum']}")
+        out.append(f"{name}_count{format_labels(workflow=wf, **labels)} {hist['count']}")
+
+    family("workflow_tasks", "gauge", "Tasks by phase and status.")
+    for key, count in sorted(store.get('tasks', {}).items()):
+        phase, status = key.split('|', 1)
+        out.append(f"workflow_tasks{format_labels(workflow=wf, phase=phase, status=status)} {count}")
+
+    family("workflow_task_transitions", "counter", "Task status changes, by phase and new status.")
+    for key, count in sorted(store.get('transitions', {}).items()):
+        phase, status = key.split('|', 1)
+        out.append(f"workflow_task_transitions_total"
+                   f"{format_labels(workflow=wf, phase=phase, status=status)} {count}")
 
+    family("workflow_task_completions", "counter",
+           "Task completions; use rate() for throughput.")
+    out.append(f"workflow_task_completions_total{format_labels(workflow=wf)} "
+               f"{store.get('completions', 0)}")
 
-def cmd_next():
+    if store.get('last_transition') is not None:
+        family("workflow_last_transition_timestamp_seconds", "gauge",
+               "Time of the last task transition; alert on staleness.")
+        out.append(f"workflow_last_transition_timestamp_seconds{format_labels(workflow=wf)} "
+                   f"{store['last_transition']:.3f}")
+
+    family("workflow_task_pending_seconds", "histogram",
+           "Time a task spent pending, from the previous transition to its completion.")
+    histogram("workflow_task_pending_seconds", 'wait', store.get('pending_seconds', new_histogram('wait')))
+
+    family("workflow_gate_blocked", "gauge", "1 while next is stopped at a phase's approval gate.")
+    for phase in sorted(store.get('gate_blocked', {})):
+        out.append(f"workflow_gate_blocked{format_labels(workflow=wf, phase=phase)} 1")
+    family("workflow_gate_wait_seconds", "histogram", "Time from hitting an approval gate to passing it.")
+    histogram("workflow_gate_wait_seconds", 'wait', store.get('gate_wait_seconds', new_histogram('wait')))
+
+    family("workflow_checks", "counter",
+           "Completion checks by reported result; unreported checks were not reported either way.")
+    for result, count in sorted(store.get('checks', {}).items()):
+        out.append(f"workflow_checks_total{format_labels(workflow=wf, result=result)} {count}")
+
+    family("workflow_router_command_seconds", "histogram", "Router command latency.")
+    for command, hist in sorted(store.get('command_seconds', {}).items()):
+        histogram("workflow_router_command_seconds", 'latency', hist, command=command)
+
+    out.append("# EOF")
+    return "\n".join(out) + "\n"
+
+def finish_metrics(config, command, elapsed):
+    """
+    Record command latency, persist the store and rewrite the textfile.
+
+    The store is saved last-writer-wins (see write_cache): when two
+    commands overlap, the updates of the one that finishes first are lost.
+    State-backed metrics are re-derived on the next sync; the rest can
+    step back, which Prometheus reads as a counter reset.
+    """
+    if _METRICS is None:
+        return
+    hist = _METRICS['command_seconds'].setdefault(command, new_histogram('latency'))
+    observe(hist, 'latency', elapsed)
+    write_cache("metrics.json", _METRICS)
+    textfile = STATE_FILE.parent.parent / metrics_settings(config)['textfile']
+    write_text_atomic(textfile, render_metrics(_METRICS))
+
+
+def store_object(text):
+    """Store text content-addressed under .snapshots/objects; return (id, created)."""
+    oid = hashlib.sha1(text.encode('utf-8')).hexdigest()
+    path = SNAPSHOT_DIR / "objects" / oid[:2] / oid[2:]
+    if path.exists():
+        return oid, False
+    write_text_atomic(path, text)  # concurrent identical writes rename the same bytes
+    return oid, True
+
+def load_object(oid):
+    """Read a stored object's text."""
+    with open(SNAPSHOT_DIR / "objects" / oid[:2] / oid[2:], 'r', encoding='utf-8') as f:
+        return f.read()
+
+def load_refs():
+    """Fork pointers, the current fork and the snapshot log."""
+    try:
+        with open(SNAPSHOT_DIR / "refs.json", 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'head': 'main', 'forks': {}, 'log': []}
+
+def save_refs(refs):
+    refs['log'] = refs['log'][-SNAPSHOT_LOG_ENTRIES:]
+    write_json_atomic(SNAPSHOT_DIR / "refs.json", refs)
+
+def split_state_text(text):
+    """
+    Split process.json as save_state lays it out (indent=2) without parsing it.
+
+    Returns a list of top-level members in file order: (prefix, items) for
+    tasks / session_history, where prefix is the raw `"key": ` and items
+    the raw text of each record, or (text, None) for any other member.
+    Joining the pieces back gives the input byte for byte. None if the
+    text is not in that layout.
+    """
+    if not (text.startswith('{\n  "') and text.endswith('\n}')):
+        return None
+    decoder = json.JSONDecoder()
+    members = []
+    for member in re.split(r',\n  (?=")', text[4:-2]):
+        try:
+            key, end = decoder.raw_decode(member)
+        except ValueError:
+            return None
+        if not isinstance(key, str) or member[end:end + 2] != ': ':
+            return None
+        value = member[end + 2:]
+        if key not in ('tasks', 'session_history'):
+            members.append((member, None))
+        elif value == '[]':
+            members.append((member[:end + 2], []))
+        elif value.startswith('[\n    ') and value.endswith('\n  ]'):
+            members.append((member[:end + 2], re.split(r',\n    (?=\S)', value[6:-4])))
+        else:
+            return None
+    return members
+
+def capture_state(refs, message):
+    """
+    Snapshot process.json into the object store and point the current fork at it.
+
+    Task records and history are stored as raw text in SNAPSHOT_CHUNK-sized
+    chunks, cut from the file without parsing or re-serializing it, so a
+    snapshot costs reading and hashing the file and only writes the chunks
+    that changed; an identical file gets the same id. If process.json is
+    unchanged since the last capture, its manifest id is reused without
+    reading the file at all.
+    Returns (snapshot id, new objects written).
+    """
+    stamp = file_stamp(STATE_FILE)
+    if stamp is not None and refs.get('head_stamp') == stamp:
+        return refs['forks'][refs['head']], 0
+
+    with open(STATE_FILE, 'r', encoding='utf-8') as f:
+        text = f.read()
+    # A hand-edited file in another layout is stored as save_state would write it
+    members = split_state_text(text) or split_state_text(json.dumps(json.loads(text), indent=2))
+    created = 0
+    layout = []
+    for prefix, items in members:
+        if items is None:
+            layout.append({'text': prefix})
+            continue
+        chunks = []
+        for start in range(0, len(items), SNAPSHOT_CHUNK):
+            oid, new = store_object(",\n    ".join(items[start:start + SNAPSHOT_CHUNK]))
+            chunks.append(oid)
+            created += new
+        layout.append({'prefix': prefix, 'chunks': chunks})
+    snapshot_id, new = store_object(json.dumps({'members': layout}, sort_keys=True))
+    created += new
+
+    if refs['forks'].get(refs['head']) != snapshot_id:
+        refs['log'].append({
+            'id': snapshot_id,
+            'fork': refs['head'],
+            'message': message,
+            'created_at': datetime.utcnow().isoformat() + 'Z'
+        })
+    refs['forks'][refs['head']] = snapshot_id
+    refs['head_stamp'] = stamp
+    return snapshot_id, created
+
+def checkout_snapshot(snapshot_id):
+    """
+    Write a snapshot back to process.json.
+
+    The file is stitched together from the stored chunk texts, so no task
+    record is parsed or re-serialized and the result is byte for byte the
+    file that was captured.
+    """
+    manifest = json.loads(load_object(snapshot_id))
+    if 'members' in manifest:
+        parts = []
+        for member in manifest['members']:
+            if 'chunks' not in member:
+                parts.append(member['text'])
+                continue
+            items = ",\n    ".join(load_object(oid) for oid in member['chunks'])
+            parts.append(member['prefix'] + (f"[\n    {items}\n  ]" if items else "[]"))
+        text = "{\n  " + ",\n  ".join(parts) + "\n}"
+    else:  # snapshot taken before chunks kept save_state's layout
+        state = dict(manifest['header'])
+        for key in ('tasks', 'session_history'):
+            state[key] = [record for oid in manifest.get(key, [])
+                          for record in json.loads(load_object(oid))]
+        text = json.dumps(state, indent=2)
+    write_text_atomic(STATE_FILE, text)
+    return file_stamp(STATE_FILE)
+
+def resolve_snapshot(refs, ref):
+    """Map a fork name or (prefix of a) snapshot id to a snapshot id."""
+    if ref in refs['forks']:
+        return refs['forks'][ref]
+    matches = {e['id'] for e in refs['log'] if e['id'].startswith(ref)}
+    return matches.pop() if len(matches) == 1 else None
+
+
+def cmd_next(budget=None, delta=False, expand=None, session='default', isolate=False):
     """Get the next pending task with minimal context."""
-    state = load_state()
-    config = load_config()
+    prefetch = load_prefetch()
+    if prefetch:
+        # complete/skip already worked out what comes next
+        task, gate, prev_phase = prefetch['task'], prefetch['gate'], prefetch['prev_phase']
+    else:
+        state = load_state()
+        i, task, gate = find_next(state, load_config())
+        prev_phase = state['tasks'][i-1]['phase'] if gate else None
     
-    # Find next pending task
-    for i, task in enumerate(state['tasks']):
-        if task['status'] == 'pending':
-            # Check for phase transition requiring approval
-            if i > 0:
-                prev_task = state['tasks'][i-1]
-                if prev_task['phase'] != task['phase']:
-                    phase_info = next(
-                        (p for p in config['phases'] if p['id'] == task['phase']), 
-                        None
-                    )
-                    if phase_info and phase_info.get('requires_approval'):
-                        print(f"⚠️  PHASE TRANSITION: {prev_task['phase']} → {task['phase']}")
-                        print(f"   Phase '{phase_info['name']}' requires approval.")
-                        print(f"   Run: python workflow.py approve-phase {task['phase']}")
-                        return
-            
-            # Load skill and output task context
-            skill = load_skill(task['skill_file'])
-            print(f"📋 CURRENT TASK: {task['id']}")
-            print(f"   Name: {task['name']}")
-            print(f"   Phase: {task['phase']}")
-            print(f"   Skill: {task['skill_file']}")
-            print()
-            if skill:
-                print("📖 INSTRUCTIONS:")
-                if 'get_instructions' in dir(importlib.util.module_from_spec(
-                    importlib.util.spec_from_file_location("skill", LIBRARY_DIR / Path(task['skill_file']).name)
-                )):
-                    skill_path = LIBRARY_DIR / Path(task['skill_file']).name
-                    spec = importlib.util.spec_from_file_location("skill", skill_path)
-                    module = importlib.util.module_from_spec(spec)
-                    spec.loader.exec_module(module)
-                    if hasattr(module, 'get_instructions'):
-                        print(module.get_instructions(task['id']))
-                else:
-                    for step in skill.get('steps', []):
-                        print(f"   {step}")
-                print()
-                print("✅ COMPLETION CHECKS:")
-                for check in skill.get('checks', []):
-                    print(f"   [ ] {check}")
-            print()
-            print(f"When done: python workflow.py complete {task['id']} -s \"your summary\"")
-            return
+    if task is None:
+        print("🎉 All tasks completed!")
+        return
+    if gate:
+        record_gate_blocked(task['phase'])
+        print(f"⚠️  PHASE TRANSITION: {prev_phase} → {task['phase']}")
+        print(f"   Phase '{gate['name']}' requires approval.")
+        print(f"   Run: python workflow.py approve-phase {task['phase']}")
+        return
     
-    print("🎉 All tasks completed!")
+    # Load skill and output task context
+    cached = prefetch['rendered'].get(task['id']) if prefetch and not isolate else None
+    if cached and cached['skill_stamp'] == file_stamp(LIBRARY_DIR / Path(task['skill_file']).name):
+        rendered = cached['rendered']
+    else:
+        rendered = render_skill(task, load_config(), isolate)
+    sections = build_next_sections(task, rendered)
+    if expand:
+        lines = next((lines for name, _, lines in sections if name == expand), None)
+        print("\n".join(lines) if lines else f"❌ Section '{expand}' not available for {task['id']}.")
+        return
+    if delta:
+        sections = apply_delta(sections, task['id'], session)
+    if budget is not None:
+        sections = truncate_sections(sections, budget)
+    
+    lines = [line for _, _, section in sections for line in section]
+    print("\n".join(lines))
+    if budget is not None or delta:
+        size = text_size(lines)
+        note = ""
+        if budget is not None and size > budget:
+            required = sum(text_size(section) for _, prio, section in sections if not prio)
+            note = f" - over --budget {budget} bytes, required sections alone are {required} bytes"
+        print(f"📏 Emitted: {size} bytes (~{-(-size // TOKEN_BYTES)} tokens){note}")
 
 
 def cmd_status():
@@ -136,26 +1140,40 @@ def cmd_status():
         print(f"  {icon} {task['id']}: {task['name']}{summary}")
 
 
-def cmd_complete(task_id, summary):
+def cmd_complete(task_id, summary, failed_checks=None, passed_checks=None):
     """Mark a task as completed."""
     state = load_state()
+    sync_metrics(state)
     
     for task in state['tasks']:
         if task['id'] == task_id:
+            previous = task['status']
             task['status'] = 'completed'
             task['summary'] = summary
             task['completed_at'] = datetime.utcnow().isoformat() + 'Z'
             
             # Log to session history
-            state['session_history'].append({
+            entry = {
                 'task_id': task_id,
                 'action': 'completed',
                 'summary': summary,
                 'timestamp': datetime.utcnow().isoformat() + 'Z'
-            })
+            }
+            if passed_checks:
+                entry['passed_checks'] = passed_checks
+            if failed_checks:
+                entry['failed_checks'] = failed_checks
+            state['session_history'].append(entry)
             
             save_state(state)
             print(f"✅ Task {task_id} marked complete.")
+            config = load_config()
+            if _METRICS is not None:
+                passed, failed = len(passed_checks or []), len(failed_checks or [])
+                total = skill_check_count(task, config)
+                unreported = max(total - passed - failed, 0) if total is not None else 0
+                record_transition(task, previous, passed, failed, unreported)
+            prefetch_next(state, config)
             return
     
     print(f"❌ Task {task_id} not found.")
@@ -163,13 +1181,17 @@ def cmd_complete(task_id, summary):
 def cmd_skip(task_id):
     """Skip a task."""
     state = load_state()
+    sync_metrics(state)
     
     for task in state['tasks']:
         if task['id'] == task_id:
+            previous = task['status']
             task['status'] = 'skipped'
             task['summary'] = 'Skipped'
             save_state(state)
             print(f"⏭️  Task {task_id} skipped.")
+            record_transition(task, previous)
+            prefetch_next(state, load_config())
             return
     
     print(f"❌ Task {task_id} not found.")
@@ -177,6 +1199,9 @@ def cmd_skip(task_id):
 
 def cmd_reset():
     """Reset all tasks to pending."""
+    refs = load_refs()
+    snapshot_id, _ = capture_state(refs, "before reset")
+    save_refs(refs)
     state = load_state()
     
     for task in state['tasks']:
@@ -185,16 +1210,548 @@ def cmd_reset():
         task['completed_at'] = None
     
     state['current_task_index'] = 0
-    state['session_history'] = []
+    # Start marker, so time-in-pending / durations of the first completion
+    # are measured from the reset rather than from workflow creation
+    state['session_history'] = [{
+        'task_id': None,
+        'action': 'reset',
+        'summary': 'All tasks reset to pending',
+        'timestamp': datetime.utcnow().isoformat() + 'Z'
+    }]
     save_state(state)
+    if _METRICS is not None:
+        rebuild_metrics(_METRICS, state)
     print("🔄 All tasks reset to pending.")
+    print(f"   Undo: python workflow.py restore {snapshot_id[:12]}")
+    prefetch_next(state, load_config())
+
+def cmd_plan(workers, show_tasks=False):
+    """Critical path, earliest/latest start and ETA for K parallel workers."""
+    state = load_state()
+    tasks = state['tasks']
+    if not tasks:
+        print("🎉 Nothing to plan - workflow has no tasks.")
+        return
+
+    meta = load_task_meta(state)
+    preds = build_graph(state, meta)
+    digest = graph_digest(state, meta)
+
+    # The topological order only changes with the DAG itself, so completions
+    # reuse it and cost a single linear pass instead of a re-sort.
+    cache = read_cache("plan.json", {})
+    order = None
+    if cache.get('graph', {}).get('digest') == digest:
+        order = cache['graph']['order']
+    else:
+        order = topo_order(preds)
+        if order is None:
+            print("❌ Dependency cycle detected - cannot plan.")
+            return
+        cache['graph'] = {'digest': digest, 'order': order}
+        write_cache("plan.json", cache)
+
+    estimates = [meta[t['id']][0] for t in tasks]
+    remaining = [0.0 if t['status'] in ('completed', 'skipped') else d
+                 for t, d in zip(tasks, estimates)]
+    _, _, total_span, _ = critical_path(order, preds, estimates)
+    es, ls, span, path = critical_path(order, preds, remaining)
+    pending = [i for i, t in enumerate(tasks) if t['status'] == 'pending']
+    unestimated = sum(1 for i in pending if not estimates[i])
+
+    print(f"🗺️  WORKFLOW PLAN: {state['workflow_id']}")
+    print(f"   Tasks: {len(tasks)} | Pending: {len(pending)}"
+          f"{f' ({unestimated} without estimate)' if unestimated else ''}")
+    print(f"   Total work: {format_minutes(sum(estimates))} | "
+          f"Remaining work: {format_minutes(sum(remaining))}")
+    print(f"   Critical path: {format_minutes(total_span)} | "
+          f"Remaining: {format_minutes(span)}")
+
+    print("\n── CRITICAL PATH ──")
+    for i in path:
+        if remaining[i]:
+            print(f"  ⬜ {tasks[i]['id']}: {tasks[i]['name']} "
+                  f"({format_minutes(remaining[i])}, start +{format_minutes(es[i])})")
+
+    if show_tasks:
+        print("\n── SCHEDULE (earliest / latest start, slack) ──")
+        for i in pending:
+            print(f"  {tasks[i]['id']}: ES +{format_minutes(es[i])} | "
+                  f"LS +{format_minutes(ls[i])} | slack {format_minutes(ls[i] - es[i])}")
+
+    print("\n── WORKERS ──")
+    for k in workers:
+        eta = simulate_workers(preds, remaining, ls, k)
+        print(f"   {k} worker(s): ETA {format_minutes(eta)}")
+
+
+def discover_workflows(target):
+    """Return process.json paths under a root directory or matching a glob."""
+    root = Path(target)
+    if root.is_file():
+        candidates = [root]
+    elif root.is_dir():
+        candidates = sorted(root.rglob('process.json'))
+    else:
+        candidates = [Path(p) for p in sorted(glob.glob(target, recursive=True))]
+
+    found = []
+    for path in candidates:
+        if path.is_dir():
+            path = next(
+                (p for p in (path / 'process.json', path / 'state' / 'process.json') if p.is_file()),
+                path
+            )
+        if path.is_file() and path.name == 'process.json':
+            found.append(path.resolve())
+    return list(dict.fromkeys(found))
+
+def summarize_workflow(state, config):
+    """Reduce one workflow's state to the fields fleet mode reports."""
+    tasks = state.get('tasks', [])
+    completed = sum(1 for t in tasks if t['status'] == 'completed')
+    skipped = sum(1 for t in tasks if t['status'] == 'skipped')
+    _, task, gate = find_next(state, config)
+    return {
+        'workflow_id': state.get('workflow_id'),
+        'total': len(tasks),
+        'completed': completed,
+        'skipped': skipped,
+        'pending': len(tasks) - completed - skipped,
+        'current_phase': state.get('current_phase'),
+        'next_task': task['id'] if task else None,
+        'next_name': task['name'] if task else None,
+        'blocked_gate': gate['id'] if gate else None,
+        'updated_at': state.get('updated_at'),
+    }
+
+def load_fleet_entry(path, cached):
+    """
+    Summarize the workflow at path, reusing cached when unchanged.
+
+    Change detection is by (mtime, size) of process.json and its sibling
+    config.json, so unchanged workflows are never read or parsed.
+    """
+    path = Path(path)
+    config_path = path.with_name('config.json')
+    try:
+        st = path.stat()
+        cst = config_path.stat()
+    except OSError as e:
+        return {'stamp': None, 'error': str(e)}
+    stamp = [st.st_mtime_ns, st.st_size, cst.st_mtime_ns, cst.st_size]
+    if cached and cached.get('stamp') == stamp:
+        return cached
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        return {'stamp': stamp, 'summary': summarize_workflow(state, config)}
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return {'stamp': stamp, 'error': f"{type(e).__name__}: {e}"}
+
+def is_stale(summary, stale_hours):
+    """True if an unfinished workflow has not been updated in stale_hours."""
+    if not summary['pending']:
+        return False
+    updated = parse_timestamp(summary.get('updated_at'))
+    return updated is not None and time.time() - updated > stale_hours * 3600
+
+
+def cmd_fleet(mode, target, output='table', jobs=None, processes=False, stale_hours=24):
+    """Aggregate status / next task across many workflow state directories."""
+    paths = discover_workflows(target)
+    if not paths:
+        print(f"❌ No process.json found under {target}")
+        return
+
+    # One entry set per target, holding only the paths found this run, so
+    # workflows that disappear or roots scanned long ago do not linger.
+    targets = read_cache("fleet.json", {})
+    cache = targets.pop(target, {})
+    keys = [str(p) for p in paths]
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor  # fleet only
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=jobs) as executor:
+        entries = list(executor.map(load_fleet_entry, keys, [cache.get(k) for k in keys],
+                                    chunksize=16 if processes else 1))
+    reused = sum(1 for k, e in zip(keys, entries) if e == cache.get(k))
+    targets[target] = dict(zip(keys, entries))
+    write_cache("fleet.json", dict(list(targets.items())[-FLEET_CACHE_TARGETS:]))
+
+    rows = []
+    for path, entry in zip(paths, entries):
+        row = {'path': str(path.parent)}
+        if 'error' in entry:
+            row['error'] = entry['error']
+        else:
+            row.update(entry['summary'])
+            row['stale'] = is_stale(entry['summary'], stale_hours)
+        rows.append(row)
+
+    if output == 'ndjson':
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+
+    ok = [r for r in rows if 'error' not in r]
+    blocked = sum(1 for r in ok if r['blocked_gate'])
+    stale = sum(1 for r in ok if r['stale'])
+    done = sum(1 for r in ok if not r['pending'])
+    print(f"🚢 FLEET {mode.upper()}: {len(rows)} workflows "
+          f"({reused} unchanged, {len(rows) - reused} loaded)")
+    print(f"   Done: {done} | Blocked gates: {blocked} | Stale: {stale} | "
+          f"Errors: {len(rows) - len(ok)}")
+    print()
+
+    for row in rows:
+        label = row.get('workflow_id') or row['path']
+        if 'error' in row:
+            print(f"  ❌ {row['path']}: {row['error']}")
+            continue
+        if not row['pending']:
+            icon, detail = "✅", "all tasks completed"
+        elif row['blocked_gate']:
+            icon, detail = "⚠️ ", f"gate: {row['blocked_gate']} requires approval"
+        else:
+            icon = "💤" if row['stale'] else "⬜"
+            detail = (f"next: {row['next_task']} {row['next_name']}" if mode == 'next'
+                      else f"phase: {row['current_phase']}")
+        progress = f"{row['completed']}/{row['total']}"
+        print(f"  {icon} {label:<28} {progress:>9}  {detail}")
+
+
+def cmd_snapshot(message=None, list_only=False):
+    """Record a snapshot of the current fork, or list forks and snapshots."""
+    refs = load_refs()
+    if list_only:
+        print(f"🌿 FORKS (current: {refs['head']})")
+        for name, snapshot_id in sorted(refs['forks'].items()):
+            marker = "*" if name == refs['head'] else " "
+            print(f"  {marker} {name}: {snapshot_id[:12]}")
+        print("\n── SNAPSHOTS ──")
+        for entry in reversed(refs['log'][-20:]):
+            note = f" - {entry['message']}" if entry.get('message') else ""
+            print(f"  {entry['id'][:12]} [{entry['fork']}] {entry['created_at']}{note}")
+        return
+
+    snapshot_id, created = capture_state(refs, message)
+    save_refs(refs)
+    print(f"📸 Snapshot {snapshot_id[:12]} on fork '{refs['head']}' ({created} new objects)")
+
+def cmd_fork(name):
+    """Branch the current state into a new fork and switch to it."""
+    refs = load_refs()
+    if name in refs['forks']:
+        print(f"❌ Fork '{name}' already exists. Use: python workflow.py restore {name}")
+        return
+    snapshot_id, created = capture_state(refs, f"fork {name}")
+    refs['forks'][name] = snapshot_id
+    refs['head'] = name
+    save_refs(refs)
+    print(f"🌿 Forked '{name}' at {snapshot_id[:12]} ({created} new objects)")
+
+def cmd_restore(ref):
+    """Switch to a fork, or roll the current fork back to a snapshot."""
+    refs = load_refs()
+    target = resolve_snapshot(refs, ref)
+    if target is None:
+        print(f"❌ No fork or unique snapshot matching '{ref}'.")
+        return
+    capture_state(refs, f"before restore {ref}")  # never lose the current fork's progress
+    if ref in refs['forks']:
+        refs['head'] = ref
+    refs['forks'][refs['head']] = target
+    refs['head_stamp'] = checkout_snapshot(target)
+    save_refs(refs)
+    print(f"⏪ Restored {target[:12]} on fork '{refs['head']}'.")
+
+def history_columns(state, cache):
+    """
+    Return (task ids, epoch seconds) of the timestamped session_history events.
+
+    Completions carry their task id; other events (the reset marker) have
+    None and only serve as the start of the next duration. History is
+    append-only, so it is read in SNAPSHOT_CHUNK-sized segments
+    and every full segment's parsed columns are cached by its position and
+    boundary timestamps; only the open tail is parsed again.
+    """
+    history = state.get('session_history', [])
+    task_ids = []
+    times = array('d')
+    for start in range(0, len(history), SNAPSHOT_CHUNK):
+        segment = history[start:start + SNAPSHOT_CHUNK]
+        key = (f"v2|{state.get('workflow_id')}|{start}|{len(segment)}|"
+               f"{segment[0].get('timestamp')}|{segment[-1].get('timestamp')}")
+        columns = cache.get(key)
+        if columns is None:
+            columns = [[], []]
+            for entry in segment:
+                moment = parse_timestamp(entry.get('timestamp'))
+                if moment is not None:
+                    completed = entry.get('action') == 'completed'
+                    columns[0].append(entry.get('task_id') if completed else None)
+                    columns[1].append(moment)
+            if len(segment) == SNAPSHOT_CHUNK:
+                cache[key] = columns
+        task_ids.extend(columns[0])
+        times.extend(columns[1])
+    return task_ids, times
+
+def import_numpy():
+    """NumPy if installed, else None. Only stats uses it, so it is imported on demand."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def group_durations(codes, durations, estimates, groups):
+    """
+    Per-group count, p50, p95 and actual/estimate ratio in one sorted pass.
+
+    codes index into groups; estimates are 0 where a task has none. Uses
+    NumPy when installed, otherwise the same algorithm over plain arrays.
+    """
+    np = import_numpy()
+    if np is not None:
+        codes = np.frombuffer(codes, dtype=np.int64)
+        durations = np.frombuffer(durations, dtype=np.float64)
+        estimates = np.frombuffer(estimates, dtype=np.float64)
+        order = np.lexsort((durations, codes))
+        ranked = durations[order]
+        counts = np.bincount(codes, minlength=len(groups))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        known = estimates > 0
+        actual_known = np.bincount(codes, weights=np.where(known, durations, 0.0), minlength=len(groups))
+        estimated = np.bincount(codes, weights=estimates, minlength=len(groups))
+
+        def quantile(q):
+            pos = starts + q * np.maximum(counts - 1, 0)
+            lo = np.floor(pos).astype(np.int64)
+            hi = np.ceil(pos).astype(np.int64)
+            valid = counts > 0
+            lo, hi = np.where(valid, lo, 0), np.where(valid, hi, 0)
+            return ranked[lo] + (ranked[hi] - ranked[lo]) * (pos - lo)
+
+        p50, p95 = quantile(0.5), quantile(0.95)
+        return [
+            (groups[g], int(counts[g]), float(p50[g]), float(p95[g]),
+             float(actual_known[g] / estimated[g]) if estimated[g] else None)
+            for g in range(len(groups)) if counts[g]
+        ]
+
+    order = sorted(range(len(codes)), key=lambda i: (codes[i], durations[i]))
+    counts = [0] * len(groups)
+    actual_known = [0.0] * len(groups)
+    estimated = [0.0] * len(groups)
+    for code, duration, estimate in zip(codes, durations, estimates):
+        counts[code] += 1
+        if estimate > 0:
+            actual_known[code] += duration
+            estimated[code] += estimate
+
+    def quantile(start, n, q):
+        pos = start + q * (n - 1)
+        lo, hi = int(pos), min(int(pos) + 1, start + n - 1)
+        low, high = durations[order[lo]], durations[order[hi]]
+        return low + (high - low) * (pos - lo)
+
+    result = []
+    start = 0
+    for g, n in enumerate(counts):
+        if n:
+            result.append((groups[g], n, quantile(start, n, 0.5), quantile(start, n, 0.95),
+                           actual_known[g] / estimated[g] if estimated[g] else None))
+        start += n
+    return result
+
+def cmd_stats(targets=None, top=10, days=14):
+    """
+    Actual vs estimated durations per task, phase and skill, plus throughput.
+
+    A completion's duration runs from the previous history event (the
+    previous completion or a reset); the first one after workflow creation
+    has no start and is left out. Estimates for this workflow include its
+    skills' TASKS entries; other targets use only the estimated_time on
+    their task records, so no foreign skill code is imported.
+    """
+    paths = [p for t in targets for p in discover_workflows(t)] if targets else [STATE_FILE]
+    cache = read_cache("stats.json", {})
+    cached_segments = len(cache)
+
+    keys = {'task': {}, 'phase': {}, 'skill': {}}
+    columns = {'task': array('q'), 'phase': array('q'), 'skill': array('q')}
+    durations = array('d')
+    estimates = array('d')
+    completed_at = array('d')
+
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ {path}: {e}")
+            continue
+        tasks = {t['id']: t for t in state.get('tasks', [])}
+        if Path(path).resolve() == STATE_FILE.resolve():
+            estimate = {tid: minutes for tid, (minutes, _) in load_task_meta(state).items()}
+        else:
+            estimate = {tid: parse_duration(t.get('estimated_time')) or 0.0
+                        for tid, t in tasks.items()}
+        task_ids, times = history_columns(state, cache)
+        previous = None
+        for task_id, moment in zip(task_ids, times):
+            start, previous = previous, moment
+            task = tasks.get(task_id)
+            if task is None or start is None:
+                continue
+            row = {
+                'task': task_id,
+                'phase': task['phase'],
+                'skill': Path(task.get('skill_file') or '?').name,
+            }
+            for name, value in row.items():
+                columns[name].append(keys[name].setdefault(value, len(keys[name])))
+            durations.append(max(moment - start, 0.0) / 60)
+            estimates.append(estimate[task_id])
+            completed_at.append(moment)
+
+    if len(cache) != cached_segments:
+        write_cache("stats.json", dict(list(cache.items())[-STATS_CACHE_SEGMENTS:]))
+    if not durations:
+        print("📈 No completions recorded yet.")
+        return
+
+    np = import_numpy()
+    backend = "numpy" if np is not None else "array"
+    print(f"📈 WORKFLOW STATS: {len(durations)} completions across {len(paths)} "
+          f"workflow(s) [{backend}]")
+    for name in ('phase', 'skill', 'task'):
+        groups = list(keys[name])
+        rows = group_durations(columns[name], durations, estimates, groups)
+        rows.sort(key=lambda r: r[3], reverse=True)
+        print(f"\n── BY {name.upper()} (slowest p95 first) ──")
+        print(f"  {'':<28} {'n':>6} {'p50':>9} {'p95':>9} {'actual/est':>11}")
+        for label, n, p50, p95, ratio in rows[:top]:
+            ratio_text = f"{ratio:.2f}x" if ratio is not None else "-"
+            print(f"  {str(label)[:28]:<28} {n:>6} {format_minutes(p50):>9} "
+                  f"{format_minutes(p95):>9} {ratio_text:>11}")
+
+    print(f"\n── THROUGHPUT (completions/day, last {days} days) ──")
+    last_day = int(max(completed_at) // 86400)
+    if np is not None:
+        day_index = np.frombuffer(completed_at, dtype=np.float64) // 86400 - (last_day - days + 1)
+        per_day = np.bincount(day_index[day_index >= 0].astype(np.int64), minlength=days).tolist()
+    else:
+        per_day = [0] * days
+        for moment in completed_at:
+            index = int(moment // 86400) - (last_day - days + 1)
+            if index >= 0:
+                per_day[index] += 1
+    peak = max(per_day) or 1
+    for offset, count in enumerate(per_day):
+        day = datetime.fromtimestamp((last_day - days + 1 + offset) * 86400, timezone.utc)
+        print(f"  {day:%Y-%m-%d} {count:>6} {'▇' * round(20 * count / peak)}")
+
+def cmd_skill_server():
+    """
+    Serve isolated skill renders until idle for settings.skill_isolation.idle_timeout.
+
+    Started on demand by render_task_isolated. Listens on localhost with a
+    random authkey published in .cache/skill_server.json (mode 0600).
+    """
+    from multiprocessing.connection import AuthenticationError, Listener
+    settings = skill_isolation_settings(load_config())
+    authkey = os.urandom(16)
+    listener = Listener(('127.0.0.1', 0), authkey=authkey)
+    write_cache(SKILL_SERVER_FILE, {
+        'address': list(listener.address), 'authkey': authkey.hex(), 'pid': os.getpid()
+    })
+    last_used = [time.time()]
+
+    def watchdog():
+        while time.time() - last_used[0] < settings['idle_timeout']:
+            time.sleep(1)
+        if read_cache(SKILL_SERVER_FILE, {}).get('pid') == os.getpid():
+            (CACHE_DIR / SKILL_SERVER_FILE).unlink()
+        shutdown_skill_pool()
+        os._exit(0)
+
+    def serve(conn):
+        with conn:
+            while True:
+                try:
+                    task = conn.recv()
+                except (EOFError, OSError):
+                    return
+                last_used[0] = time.time()
+                conn.send(pool_render(task, settings))
+                last_used[0] = time.time()
+
+    threading.Thread(target=watchdog, daemon=True).start()
+    get_skill_pool(settings)
+    while True:
+        try:
+            conn = listener.accept()
+        except (OSError, EOFError, AuthenticationError):
+            continue
+        threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+def cmd_metrics(serve=None, host='127.0.0.1'):
+    """Print OpenMetrics exposition, or serve it over HTTP at /metrics."""
+    def snapshot():
+        store = read_cache("metrics.json", None) or {}
+        if store.get('state_stamp') != file_stamp(STATE_FILE):
+            rebuild_metrics(store, load_state())
+        return render_metrics(store)
+
+    if serve is None:
+        print(snapshot(), end="")
+        return
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer  # --serve only
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = snapshot().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type',
+                             'application/openmetrics-text; version=1.0.0; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    print(f"📈 Serving metrics on http://{host}:{serve}/metrics (Ctrl+C to stop)")
+    try:
+        ThreadingHTTPServer((host, serve), MetricsHandler).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
 
 def main():
     parser = argparse.ArgumentParser(description='State-Machine Skills CLI')
     subparsers = parser.add_subparsers(dest='command', help='Commands')
     
     # next
-    subparsers.add_parser('next', help='Get next pending task')
+    next_parser = subparsers.add_parser('next', help='Get next pending task')
+    next_parser.add_argument('--budget', type=parse_budget, default=None,
+                             help='Cap output size: BYTES or TOKENS with a t suffix (e.g. 500t)')
+    next_parser.add_argument('--delta', action='store_true',
+                             help='Only print sections changed since the last next')
+    next_parser.add_argument('--expand', choices=['instructions', 'checks'],
+                             help='Print one section in full')
+    next_parser.add_argument('--session', default=os.environ.get('WORKFLOW_SESSION', 'default'),
+                             help='Session key for --delta (default: $WORKFLOW_SESSION)')
+    next_parser.add_argument('--isolate', action='store_true',
+                             help='Run the skill in the worker pool (see settings.skill_isolation)')
     
     # status
     subparsers.add_parser('status', help='Show workflow progress')
@@ -203,6 +1760,10 @@ def main():
     complete_parser = subparsers.add_parser('complete', help='Mark task complete')
     complete_parser.add_argument('task_id', help='Task ID to complete')
     complete_parser.add_argument('-s', '--summary', required=True, help='Completion summary')
+    complete_parser.add_argument('--passed-check', action='append', dest='passed_checks',
+                                 metavar='CHECK', help='Record a completion check that passed')
+    complete_parser.add_argument('--failed-check', action='append', dest='failed_checks',
+                                 metavar='CHECK', help='Record a completion check that failed')
     
     # skip
     skip_parser = subparsers.add_parser('skip', help='Skip a task')
@@ -211,20 +1772,90 @@ def main():
     # reset
     subparsers.add_parser('reset', help='Reset all tasks')
     
+    # plan
+    plan_parser = subparsers.add_parser('plan', help='Critical path and ETA analysis')
+    plan_parser.add_argument('-w', '--workers', type=positive_int, nargs='+', default=[1],
+                             help='Parallel worker counts to simulate')
+    plan_parser.add_argument('--tasks', action='store_true',
+                             help='Show earliest/latest start for every pending task')
+    
+    # fleet
+    fleet_parser = subparsers.add_parser('fleet', help='Aggregate many workflows')
+    fleet_parser.add_argument('mode', choices=['status', 'next'], help='What to report')
+    fleet_parser.add_argument('target', help='Root directory or glob of state directories')
+    fleet_parser.add_argument('--ndjson', action='store_const', const='ndjson', default='table',
+                              dest='output', help='Emit one JSON object per workflow')
+    fleet_parser.add_argument('-j', '--jobs', type=positive_int, default=None, help='Pool size')
+    fleet_parser.add_argument('--processes', action='store_true',
+                              help='Use a process pool instead of threads')
+    fleet_parser.add_argument('--stale-hours', type=float, default=24,
+                              help='Flag unfinished workflows idle this long')
+    
+    # snapshot / fork / restore
+    snapshot_parser = subparsers.add_parser('snapshot', help='Snapshot the current state')
+    snapshot_parser.add_argument('-m', '--message', help='Note stored with the snapshot')
+    snapshot_parser.add_argument('--list', action='store_true', help='List forks and snapshots')
+    fork_parser = subparsers.add_parser('fork', help='Branch the workflow into a new fork')
+    fork_parser.add_argument('name', help='Fork name')
+    restore_parser = subparsers.add_parser('restore', help='Switch fork or restore a snapshot')
+    restore_parser.add_argument('ref', help='Fork name or snapshot id (prefix)')
+    
+    # stats
+    stats_parser = subparsers.add_parser('stats', help='Duration analytics from completion history')
+    stats_parser.add_argument('targets', nargs='*',
+                              help='State dirs, roots or globs (default: this workflow)')
+    stats_parser.add_argument('--top', type=positive_int, default=10, help='Rows per grouping')
+    stats_parser.add_argument('--days', type=positive_int, default=14, help='Days of throughput trend')
+    
+    # skill-server (started automatically by isolated rendering)
+    subparsers.add_parser('skill-server', help='Persistent isolated skill worker pool')
+    
+    # metrics
+    metrics_parser = subparsers.add_parser('metrics', help='OpenMetrics exposition')
+    metrics_parser.add_argument('--serve', type=int, metavar='PORT', help='Serve /metrics over HTTP')
+    metrics_parser.add_argument('--host', default='127.0.0.1', help='Bind address for --serve')
+    
     args = parser.parse_args()
     
+    try:
+        config = load_config()
+    except (OSError, ValueError):
+        config = {}
+    start_metrics(config)
+    started = time.perf_counter()
+    
     if args.command == 'next':
-        cmd_next()
+        cmd_next(args.budget, args.delta, args.expand, args.session, args.isolate)
     elif args.command == 'status':
         cmd_status()
     elif args.command == 'complete':
-        cmd_complete(args.task_id, args.summary)
+        cmd_complete(args.task_id, args.summary, args.failed_checks, args.passed_checks)
     elif args.command == 'skip':
         cmd_skip(args.task_id)
     elif args.command == 'reset':
         cmd_reset()
+    elif args.command == 'plan':
+        cmd_plan(args.workers, args.tasks)
+    elif args.command == 'fleet':
+        cmd_fleet(args.mode, args.target, args.output, args.jobs, args.processes, args.stale_hours)
+    elif args.command == 'snapshot':
+        cmd_snapshot(args.message, args.list)
+    elif args.command == 'fork':
+        cmd_fork(args.name)
+    elif args.command == 'restore':
+        cmd_restore(args.ref)
+    elif args.command == 'stats':
+        cmd_stats(args.targets, args.top, args.days)
+    elif args.command == 'skill-server':
+        cmd_skill_server()
+    elif args.command == 'metrics':
+        cmd_metrics(args.serve, args.host)
     else:
         parser.print_help()
+        return
+    
+    if args.command != 'metrics':
+        finish_metrics(config, args.command, time.perf_counter() - started)
 
 if __name__ == '__main__':
     main()